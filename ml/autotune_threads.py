@@ -0,0 +1,331 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+import queue as queue_mod
+import multiprocessing as mp
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_IMAGES = BASE_DIR.parent / "server" / "uploads"
+DEFAULT_OUT = Path(os.getenv("THREAD_PROFILE", str(BASE_DIR / "thread_profile.json")))
+
+TARGETS = ("predict", "predict_worker", "predict_plantnet")
+THREAD_ENV = (
+    "OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS",
+)
+
+
+def parse_int_list(s: str):
+    return [int(x) for x in s.split(",") if x.strip()]
+
+
+def find_images(root: Path, limit: int):
+    # uploads у server/ збережені без розширень, тому беремо все, що відкриває PIL
+    from PIL import Image
+
+    out = []
+    for p in sorted(root.rglob("*")):
+        if not p.is_file():
+            continue
+        try:
+            with Image.open(p) as im:
+                im.verify()
+        except Exception:
+            continue
+        out.append(str(p))
+        if len(out) >= limit:
+            break
+    return out
+
+
+def run_predict_script(path: str, env) -> dict:
+    """Один запуск predict.py як у mlWorker.js; повертає його JSON."""
+    proc = subprocess.run(
+        [sys.executable, str(BASE_DIR / "predict.py"), path],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    for line in reversed(proc.stdout.strip().splitlines()):
+        if line.startswith("{"):
+            try:
+                return json.loads(line)
+            except ValueError:
+                break
+    return {"ok": False, "reason": "no_json", "message": (proc.stderr or "").strip()[-300:]}
+
+
+def plant_images(paths):
+    """
+    Лише фото, на яких predict.py доходить до ResNet (ok=True): not_plant пропускає класифікатор
+    і спотворив би заміри. Помилки середовища (clip_missing, hf_missing, ...) зупиняють перебір.
+    """
+    keep = []
+    for p in paths:
+        res = run_predict_script(p, dict(os.environ))
+        if res.get("ok"):
+            keep.append(p)
+        elif res.get("reason") in ("not_plant", "bad_image", "too_large"):
+            print(f"  пропускаю {Path(p).name}: {res.get('reason')}")
+        else:
+            raise SystemExit(f"❌ predict.py {res.get('reason')}: {res.get('message', '')}")
+    return keep
+
+
+def write_candidate_profile(target: str, intra: int, inter: int) -> str:
+    fd, path = tempfile.mkstemp(prefix="thread_profile_", suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"profiles": {target: {"intra_op": intra, "inter_op": inter}}}, f)
+    return path
+
+
+def set_thread_env(intra: int, inter: int):
+    for name in THREAD_ENV:
+        os.environ[name] = str(inter if name == "TF_NUM_INTEROP_THREADS" else intra)
+
+
+def make_runner(target: str, paths, intra: int, inter: int, profile_path: str = None):
+    """
+    Завантажує справжні моделі цільового скрипта і повертає run(batch_paths).
+    Імпорти фреймворків — тільки тут, після set_thread_env.
+    """
+    sys.path.insert(0, str(BASE_DIR))
+
+    if target == "predict":
+        # server/src/services/mlWorker.js запускає predict.py окремим процесом на кожен запит
+        # (з завантаженням CLIP і ResNet), тож міряємо саме це: end-to-end, батч 1.
+        # Кандидат передається тимчасовим thread_profile.json, тож predict.py проходить той самий
+        # шлях apply_env -> configure_torch (з set_num_interop_threads), що й у продакшені.
+        env = {k: v for k, v in os.environ.items() if k not in THREAD_ENV}
+        env["THREAD_PROFILE"] = profile_path
+
+        def run(batch_paths):
+            for p in batch_paths:
+                res = run_predict_script(p, env)
+                if not res.get("ok"):
+                    raise RuntimeError(f"predict.py {res.get('reason')}: {res.get('message', '')}")
+
+        return run
+
+    import numpy as np
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(intra)
+    tf.config.threading.set_inter_op_parallelism_threads(inter)
+
+    if target == "predict_worker":
+        import predict_worker as mod
+    else:
+        import predict_plantnet as mod
+
+    model = tf.keras.models.load_model(mod.MODEL_PATH)
+
+    def prep(p):
+        x = mod.preprocess(p)
+        return x[0] if isinstance(x, tuple) else x
+
+    cache = {p: prep(p) for p in paths}
+
+    def run(batch_paths):
+        x = np.concatenate([cache[p] for p in batch_paths], axis=0)
+        model.predict(x, verbose=0)
+
+    return run
+
+
+def worker_main(target, paths, intra, inter, batch, iters, barrier, queue, timeout, profile_path):
+    set_thread_env(intra, inter)
+    try:
+        run = make_runner(target, paths, intra, inter, profile_path)
+        batches = [[paths[(i * batch + j) % len(paths)] for j in range(batch)] for i in range(iters + 1)]
+        run(batches[0])  # прогрів
+
+        barrier.wait(timeout)
+        lat = []
+        t0 = time.perf_counter()
+        for b in batches[1:]:
+            s = time.perf_counter()
+            run(b)
+            lat.append(time.perf_counter() - s)
+        t1 = time.perf_counter()
+        queue.put({"ok": True, "lat": lat, "images": iters * batch, "t0": t0, "t1": t1})
+    except Exception as e:
+        try:
+            barrier.abort()
+        except Exception:
+            pass
+        queue.put({"ok": False, "error": str(e)})
+
+
+def collect(procs, queue, timeout):
+    """
+    Результати від усіх воркерів; None, якщо хтось упав без відповіді (OOM-kill, segfault)
+    або вийшов загальний час. Тоді решту воркерів зупиняємо.
+    """
+    results = []
+    deadline = time.monotonic() + timeout
+    while len(results) < len(procs):
+        try:
+            results.append(queue.get(timeout=2.0))
+            continue
+        except queue_mod.Empty:
+            pass
+        dead = [p.exitcode for p in procs if p.exitcode not in (None, 0)]
+        if dead or time.monotonic() > deadline:
+            for p in procs:
+                if p.is_alive():
+                    p.terminate()
+            for p in procs:
+                p.join()
+            reason = f"worker exit code {dead[0]}" if dead else f"timeout {timeout:.0f} s"
+            return None, reason
+    for p in procs:
+        p.join()
+    return results, None
+
+
+def measure(target, paths, intra, inter, workers, batch, iters, timeout):
+    import numpy as np
+
+    profile_path = write_candidate_profile(target, intra, inter) if target == "predict" else None
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    queue = ctx.Queue()
+    procs = [
+        ctx.Process(
+            target=worker_main,
+            args=(target, paths, intra, inter, batch, iters, barrier, queue, timeout, profile_path),
+        )
+        for _ in range(workers)
+    ]
+    try:
+        for p in procs:
+            p.start()
+        results, reason = collect(procs, queue, timeout)
+    finally:
+        if profile_path:
+            os.remove(profile_path)
+    if results is None:
+        return {"ok": False, "error": reason}
+
+    errors = [r["error"] for r in results if not r["ok"]]
+    if errors:
+        return {"ok": False, "error": errors[0]}
+
+    lat = np.array([x for r in results for x in r["lat"]], dtype=np.float64)
+    wall = max(r["t1"] for r in results) - min(r["t0"] for r in results)
+    images = sum(r["images"] for r in results)
+    return {
+        "ok": True,
+        "throughput": float(images / wall) if wall > 0 else 0.0,
+        "p50_ms": float(np.percentile(lat, 50) * 1000.0),
+        "p95_ms": float(np.percentile(lat, 95) * 1000.0),
+    }
+
+
+def pick_best(rows, max_p95_ms, concurrency):
+    # усі predict-скрипти обслуговують по одному фото — потоки обираємо лише з рядків batch == 1,
+    # і лише серед вимірів з очікуваною кількістю паралельних запитів (застосовуються тільки потоки)
+    ok = [r for r in rows if r.get("ok") and r["batch"] == 1 and r["workers"] == concurrency]
+    if max_p95_ms > 0:
+        within = [r for r in ok if r["p95_ms"] <= max_p95_ms]
+        ok = within or ok
+    if not ok:
+        return None
+    return max(ok, key=lambda r: (r["throughput"], -r["p95_ms"]))
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    default_threads = sorted({t for t in (1, 2, 4, 8, 16, cpus) if t <= cpus})
+
+    ap = argparse.ArgumentParser(description="Перебір потоків × воркерів × батчів і запис thread_profile.json")
+    ap.add_argument("--target", choices=TARGETS, default="predict")
+    ap.add_argument("--images", type=str, default=str(DEFAULT_IMAGES))
+    ap.add_argument("--max_images", type=int, default=32)
+    ap.add_argument("--threads", type=str, default=",".join(str(t) for t in default_threads))
+    ap.add_argument("--inter_op", type=str, default="1")
+    ap.add_argument("--workers", type=str, default="1,2,4")
+    ap.add_argument("--concurrency", type=int, default=1,
+                    help="очікувана кількість паралельних запитів; потоки обираються для неї")
+    ap.add_argument("--batch", type=str, default="1,4,8")
+    ap.add_argument("--iters", type=int, default=10, help="батчів на воркер у кожному вимірі")
+    ap.add_argument("--max_p95_ms", type=float, default=0.0, help="0 = без обмеження латентності")
+    ap.add_argument("--timeout", type=float, default=1800.0, help="секунд на один вимір, далі воркери зупиняються")
+    ap.add_argument("--allow_oversubscribe", action="store_true", help="міряти й threads*workers > CPU")
+    ap.add_argument("--out", type=str, default=str(DEFAULT_OUT))
+    args = ap.parse_args()
+
+    paths = find_images(Path(args.images), args.max_images)
+    if not paths:
+        raise SystemExit(f"❌ Нема зображень у {args.images}")
+    if args.target == "predict":
+        print("🔎 Відбираю фото рослин (predict.py end-to-end)...")
+        paths = plant_images(paths)
+        if not paths:
+            raise SystemExit("❌ Жодне фото не пройшло гейт рослини — потрібні фото листя")
+    print(f"✅ Зображень: {len(paths)}, CPU: {cpus}, ціль: {args.target}")
+
+    # батч 1 — те, що реально обслуговують скрипти; більші батчі лише для довідки в sweeps.
+    # predict.py — один процес на фото, тож для нього тільки 1
+    batches = [1] if args.target == "predict" else sorted(set(parse_int_list(args.batch)) | {1})
+
+    rows = []
+    for workers in sorted(set(parse_int_list(args.workers)) | {args.concurrency}):
+        for intra in parse_int_list(args.threads):
+            if intra * workers > cpus and not args.allow_oversubscribe:
+                continue
+            for inter in parse_int_list(args.inter_op):
+                for batch in batches:
+                    r = measure(args.target, paths, intra, inter, workers, batch, args.iters, args.timeout)
+                    r.update({"intra_op": intra, "inter_op": inter, "workers": workers, "batch": batch})
+                    rows.append(r)
+                    if r["ok"]:
+                        print(
+                            f"threads={intra:<3} inter={inter:<2} workers={workers:<2} batch={batch:<3} "
+                            f"-> {r['throughput']:.2f} img/s, p95 {r['p95_ms']:.1f} ms"
+                        )
+                    else:
+                        print(f"threads={intra} workers={workers} batch={batch} -> ❌ {r['error']}")
+
+    best = pick_best(rows, args.max_p95_ms, args.concurrency)
+    if best is None:
+        raise SystemExit(f"❌ Жоден вимір з workers={args.concurrency}, batch=1 не вдався")
+
+    out = Path(args.out)
+    profile = {}
+    if out.exists():
+        with open(out, "r", encoding="utf-8") as f:
+            profile = json.load(f)
+
+    profile["host"] = {"node": platform.node(), "cpu_count": cpus, "machine": platform.machine()}
+    profile.setdefault("profiles", {})[args.target] = {
+        "intra_op": best["intra_op"],
+        "inter_op": best["inter_op"],
+        # під яку кількість паралельних запитів підібрано потоки
+        "concurrency": args.concurrency,
+        "throughput": best["throughput"],
+        "p95_ms": best["p95_ms"],
+        "max_p95_ms": args.max_p95_ms,
+        "measured_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    profile.setdefault("sweeps", {})[args.target] = rows
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+
+    print(
+        f"🏁 Найкраще для {args.concurrency} паралельних запитів: threads={best['intra_op']} "
+        f"inter={best['inter_op']} ({best['throughput']:.2f} img/s, p95 {best['p95_ms']:.1f} ms)"
+    )
+    print("✅ Профіль збережено:", out.resolve())
+
+
+if __name__ == "__main__":
+    main()
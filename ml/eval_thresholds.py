@@ -0,0 +1,318 @@
+import os
+
+os.environ["TRANSFORMERS_NO_TF"] = "1"
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+MODELS = ("predict", "predict_worker", "predict_plantnet")
+IMG_EXT = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+GRID = np.round(np.linspace(0.0, 1.0, 101), 2)
+RATIO_GRID = np.round(np.linspace(0.0, 0.1, 101), 3)  # частка зеленого — дрібні значення (PLANT_MIN_RATIO=0.006)
+TEMPS = np.round(np.linspace(0.25, 5.0, 96), 2)
+
+# env-змінні, які реально читає кожен скрипт — рекомендуємо тільки їх
+# (температура — лише діагностика калібрування, жоден скрипт її не застосовує)
+SCRIPT_ENV = {
+    "predict": {"PLANT_MIN_SCORE", "TOP_K"},
+    "predict_worker": {"PLANT_MIN_RATIO", "UNSURE_THRESHOLD", "TOP_K"},
+    # predict_worker з USE_STUDENT=1 (predict_student): гейт за plant_score, без частки зеленого й UNSURE
+    "predict_worker_student": {"PLANT_MIN_SCORE", "TOP_K"},
+    "predict_plantnet": {"UNSURE_THRESHOLD", "TOP_K"},
+}
+
+
+def norm_label(s: str) -> str:
+    return "".join(ch for ch in str(s).lower() if ch.isalnum())
+
+
+def find_labeled(root: Path):
+    """Структура як у train.py: <root>/<клас>/<фото>."""
+    paths, labels = [], []
+    for d in sorted(p for p in root.iterdir() if p.is_dir()):
+        for p in sorted(d.rglob("*")):
+            if p.is_file() and p.suffix.lower() in IMG_EXT:
+                paths.append(str(p))
+                labels.append(d.name)
+    return paths, labels
+
+
+# ===== BUILD: один прогін кожної моделі =====
+
+def run_predict(paths, batch):
+    # ті самі вчителі, що й у дистиляції (CLIP-гейт + ResNet-50); teacher_pass відкриває фото
+    # через open_bounded, як predict.py, тож PLANT_MIN_SCORE підбирається на тих самих пікселях
+    from train_distill import teacher_pass
+
+    logits, plant, names, ms = teacher_pass(paths, batch)
+    return {"logits": logits, "classes": np.array(names), "plant_score": plant}, ms
+
+
+def run_keras(module_name, paths, batch):
+    import importlib
+    import tensorflow as tf
+
+    mod = importlib.import_module(module_name)
+    if not mod.MODEL_PATH.exists():
+        raise FileNotFoundError(f"Model not found: {mod.MODEL_PATH}")
+
+    model = tf.keras.models.load_model(mod.MODEL_PATH)
+    labels = mod.load_labels()
+    classes = np.array([labels.get(i, f"class_{i}") for i in range(len(labels))])
+
+    probs, plant, ratios = [], [], []
+    t_total = 0.0
+    for s in range(0, len(paths), batch):
+        xs = []
+        for p in paths[s:s + batch]:
+            out = mod.preprocess(p)
+            if isinstance(out, tuple):
+                xs.append(out[0])
+                ratios.append(out[1])
+            else:
+                xs.append(out)
+        t0 = time.perf_counter()
+        y = model.predict(np.concatenate(xs, axis=0), verbose=0)
+        t_total += time.perf_counter() - t0
+        if isinstance(y, (list, tuple)):  # учень з train_distill.py: [probs, plant]
+            plant.append(np.asarray(y[1])[:, 0])
+            y = y[0]
+        probs.append(np.asarray(y))
+
+    cols = {
+        # зберігаємо log-ймовірності: softmax(log p) == p, тож калібрування працює як з логітами
+        "logits": np.log(np.concatenate(probs).astype(np.float32) + 1e-12),
+        "classes": classes,
+        # який файл моделі закешовано — від цього залежить, які env-змінні скрипт читає
+        "student": np.bool_(getattr(mod, "USE_STUDENT", False)),
+    }
+    if ratios and not cols["student"]:
+        cols["green_ratio"] = np.array(ratios, dtype=np.float32)
+    if plant:
+        cols["plant_score"] = np.concatenate(plant).astype(np.float32)
+    return cols, 1000.0 * t_total / max(1, len(paths))
+
+
+def cmd_build(args):
+    root = Path(args.data_dir).resolve()
+    if not root.exists():
+        raise SystemExit(f"❌ Нема папки: {root}")
+
+    paths, labels = find_labeled(root)
+    if not paths:
+        raise SystemExit(f"❌ Не знайшов фото у {root}/<клас>/")
+    print(f"✅ Фото: {len(paths)}, класів: {len(set(labels))}")
+
+    cache = {
+        "paths": np.array(paths),
+        "y_true": np.array(labels),
+        "is_plant": np.array([lbl != args.negative_class for lbl in labels]),
+    }
+
+    for name in [m for m in args.models.split(",") if m]:
+        if name not in MODELS:
+            raise SystemExit(f"❌ Невідома модель: {name}")
+        print(f"🚀 {name}...")
+        try:
+            if name == "predict":
+                cols, ms = run_predict(paths, args.batch)
+            else:
+                cols, ms = run_keras(name, paths, args.batch)
+        except Exception as e:
+            print(f"⚠️ {name} пропущено: {e}")
+            continue
+        for k, v in cols.items():
+            cache[f"{name}__{k}"] = v
+        cache[f"{name}__ms"] = np.float32(ms)
+        print(f"✅ {name}: {ms:.1f} мс/фото")
+
+    np.savez_compressed(args.cache, **cache)
+    print("✅ Кеш збережено:", Path(args.cache).resolve())
+
+
+# ===== SWEEP: усе векторно з кешу =====
+
+def softmax(z, t=1.0):
+    z = z / t
+    z = z - z.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def true_index(y_true, classes):
+    lut = {norm_label(c): i for i, c in enumerate(classes)}
+    return np.array([lut.get(norm_label(y), -1) for y in y_true])
+
+
+def calibrate(logits, y):
+    """Перебір температури по сітці; кожна T — один векторний прохід по N×C."""
+    rows = np.arange(len(y))
+    nll = np.array([-np.log(softmax(logits, t)[rows, y] + 1e-12).mean() for t in TEMPS])
+    best = int(nll.argmin())
+    return float(TEMPS[best]), float(nll[np.argmin(np.abs(TEMPS - 1.0))]), float(nll[best])
+
+
+def ece(conf, correct, bins=15):
+    idx = np.minimum((conf * bins).astype(int), bins - 1)
+    c = np.bincount(idx, weights=conf, minlength=bins)
+    a = np.bincount(idx, weights=correct.astype(np.float64), minlength=bins)
+    return float(np.abs(a - c).sum() / max(1, len(conf)))
+
+
+def gate_sweep(score, is_plant, grid):
+    """Для кожного порогу: частка рослин, що проходять гейт (recall), і точність гейта."""
+    accept = score[:, None] >= grid[None, :]
+    tp = (accept & is_plant[:, None]).sum(0)
+    fp = (accept & ~is_plant[:, None]).sum(0)
+    recall = tp / max(1, int(is_plant.sum()))
+    precision = np.where(tp + fp > 0, tp / np.maximum(1, tp + fp), 1.0)
+    return recall, precision
+
+
+def coverage_sweep(conf, correct):
+    """Крива precision/coverage для порогу «не впевнено»."""
+    keep = conf[:, None] >= GRID[None, :]
+    n_keep = keep.sum(0)
+    coverage = n_keep / max(1, len(conf))
+    precision = np.where(n_keep > 0, (keep & correct[:, None]).sum(0) / np.maximum(1, n_keep), 1.0)
+    return coverage, precision
+
+
+def topk_acc(probs, y, kmax=5):
+    kmax = min(kmax, probs.shape[1])
+    order = np.argsort(-probs, axis=1)[:, :kmax]
+    hit = order == y[:, None]
+    return np.cumsum(hit, axis=1).astype(bool).mean(0)
+
+
+def analyze_model(name, c, is_plant, y_true, args):
+    logits = c[f"{name}__logits"]
+    classes = list(c[f"{name}__classes"])
+    y = true_index(y_true, classes)
+    known = (y >= 0) & is_plant
+
+    script = name
+    if f"{name}__student" in c.files and bool(c[f"{name}__student"]):
+        script = f"{name}_student"
+    allowed = SCRIPT_ENV[script]
+
+    out = {"ms_per_image": float(c[f"{name}__ms"]), "labeled_in_model_space": int(known.sum()), "script": script}
+    rec = {}
+
+    # гейт рослини: plant_score (CLIP / учень) або частка зеленого (predict_worker)
+    for col, env in (("plant_score", "PLANT_MIN_SCORE"), ("green_ratio", "PLANT_MIN_RATIO")):
+        key = f"{name}__{col}"
+        if key not in c.files or is_plant.all() or not is_plant.any():
+            continue
+        grid = GRID if col == "plant_score" else RATIO_GRID
+        recall, precision = gate_sweep(c[key], is_plant, grid)
+        ok = np.where(recall >= args.min_plant_recall)[0]
+        i = int(ok.max()) if len(ok) else 0
+        rec[env] = float(grid[i])
+        out[f"{col}_curve"] = {"threshold": grid.tolist(), "plant_recall": recall.tolist(), "gate_precision": precision.tolist()}
+
+    if not known.any():
+        out["note"] = "жодна мітка не збіглася з класами моделі — лише гейт"
+        out["recommended"] = {k: v for k, v in rec.items() if k in allowed}
+        return out
+
+    lg, yk = logits[known], y[known]
+    T, nll_1, nll_T = calibrate(lg, yk)
+    probs = softmax(lg)
+    probs_T = softmax(lg, T)
+    pred = probs.argmax(1)
+    correct = pred == yk
+    conf_T = probs_T.max(1)
+
+    # скрипти порівнюють з порогом некалібровану впевненість — її й перебираємо
+    coverage, precision = coverage_sweep(probs.max(1), correct)
+    ok = np.where((precision >= args.target_precision) & (coverage > 0))[0]
+    i = int(ok.min()) if len(ok) else len(GRID) - 1
+    rec["UNSURE_THRESHOLD"] = float(GRID[i])
+
+    acc_k = topk_acc(probs, yk)
+    hit = np.where(acc_k >= args.target_topk)[0]
+    rec["TOP_K"] = int(hit.min() + 1) if len(hit) else int(len(acc_k))
+
+    C = len(classes)
+    cm = np.bincount(yk * C + pred, minlength=C * C).reshape(C, C)
+    used = np.where(cm.sum(0) + cm.sum(1) > 0)[0]
+
+    out.update({
+        "accuracy": float(correct.mean()),
+        "topk_accuracy": [float(a) for a in acc_k],
+        "calibration": {
+            "temperature": T,
+            "nll_T1": nll_1,
+            "nll_T": nll_T,
+            "ece_T1": ece(probs.max(1), correct),
+            "ece_T": ece(conf_T, correct),
+        },
+        "coverage_curve": {"threshold": GRID.tolist(), "coverage": coverage.tolist(), "precision": precision.tolist()},
+        "confusion": {"labels": [classes[j] for j in used], "matrix": cm[np.ix_(used, used)].tolist()},
+        "recommended": {k: v for k, v in rec.items() if k in allowed},
+    })
+    return out
+
+
+def cmd_sweep(args):
+    t0 = time.perf_counter()
+    c = np.load(args.cache, allow_pickle=False)
+    y_true = c["y_true"]
+    is_plant = c["is_plant"]
+
+    report = {"samples": int(len(y_true)), "plants": int(is_plant.sum()), "models": {}}
+    for name in MODELS:
+        if f"{name}__logits" in c.files:
+            report["models"][name] = analyze_model(name, c, is_plant, y_true, args)
+    report["sweep_ms"] = 1000.0 * (time.perf_counter() - t0)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for name, r in report["models"].items():
+        print(f"📊 {r['script']}: accuracy={r.get('accuracy', float('nan')):.3f}")
+        for k, v in r["recommended"].items():
+            print(f"   {k}={v}")
+        if "calibration" in r:
+            cal = r["calibration"]
+            print(f"   (діагностика) T={cal['temperature']}, ECE {cal['ece_T1']:.3f} -> {cal['ece_T']:.3f}")
+    print(f"⏱️ Перебір: {report['sweep_ms']:.1f} мс")
+    print("✅ Звіт:", Path(args.out).resolve())
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Кеш логітів і векторний перебір порогів/калібрування")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("build", help="один прогін моделей по розміченому набору")
+    b.add_argument("--data_dir", type=str, default="data/test")
+    b.add_argument("--models", type=str, default=",".join(MODELS))
+    b.add_argument("--negative_class", type=str, default="not_plant", help="папка з фото без рослин")
+    b.add_argument("--batch", type=int, default=16)
+    b.add_argument("--cache", type=str, default="eval_cache.npz")
+    b.set_defaults(func=cmd_build)
+
+    s = sub.add_parser("sweep", help="пороги, калібрування, матриці з кешу")
+    s.add_argument("--cache", type=str, default="eval_cache.npz")
+    s.add_argument("--out", type=str, default="thresholds_report.json")
+    s.add_argument("--min_plant_recall", type=float, default=0.97)
+    s.add_argument("--target_precision", type=float, default=0.90)
+    s.add_argument("--target_topk", type=float, default=0.95)
+    s.set_defaults(func=cmd_sweep)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
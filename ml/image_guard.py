@@ -0,0 +1,118 @@
+import os
+import sys
+import tracemalloc
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+try:
+    import resource  # немає на Windows
+except ImportError:
+    resource = None
+
+# бюджет пікселів за заголовком (до декодування) і розмір, до якого зменшуємо при декодуванні
+MAX_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "40000000"))
+DECODE_MAX_SIDE = int(os.getenv("DECODE_MAX_SIDE", "1024"))
+# висота смуги для масок (ExG / HSV) — замість повнорозмірних int16/HSV копій
+STRIP_ROWS = int(os.getenv("MASK_STRIP_ROWS", "256"))
+
+MB = 1024.0 * 1024.0
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def rss_peak_mb() -> Optional[float]:
+    """Пік RSS усього процесу (для predict.py це і є один запит)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux віддає КБ, macOS — байти
+    return round(peak / (MB if sys.platform == "darwin" else 1024.0), 1)
+
+
+class MemoryMeter:
+    """
+    Пік пам'яті шляху зображення на один запит:
+    tracemalloc (numpy/Python) + найбільший декодований кадр PIL (його буфер tracemalloc не бачить).
+    """
+
+    def __enter__(self):
+        self._own = not tracemalloc.is_tracing()
+        if self._own:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._active = True
+        self.decoded_bytes = 0
+        self.decoded_size = None
+        self.peak_mb = 0.0
+        return self
+
+    def track(self, *imgs: Image.Image) -> None:
+        """Кадри, які одночасно живуть у пам'яті (напр. P/L/RGBA-оригінал і його RGB-копія)."""
+        n = sum(im.width * im.height * len(im.getbands()) for im in imgs)
+        if n > self.decoded_bytes:
+            self.decoded_bytes = n
+            self.decoded_size = [imgs[0].width, imgs[0].height]
+
+    def _update(self) -> None:
+        if self._active:
+            _, peak = tracemalloc.get_traced_memory()
+            self.peak_mb = (peak + self.decoded_bytes) / MB
+
+    def __exit__(self, *exc):
+        self._update()
+        self._active = False
+        if self._own:
+            tracemalloc.stop()
+        return False
+
+    def report(self, include_rss: bool = True) -> Dict[str, Any]:
+        """
+        Можна викликати й усередині with (відповідь з помилкою до виходу з блоку).
+        include_rss=False для довгоживучих процесів: ru_maxrss там — пік за весь час, а не за запит.
+        """
+        self._update()
+        out = {
+            "image_peak_mb": round(self.peak_mb, 2),
+            "decoded_size": self.decoded_size,
+        }
+        if include_rss:
+            out["rss_peak_mb"] = rss_peak_mb()
+        return out
+
+
+def open_bounded(path: str, max_side: int = DECODE_MAX_SIDE, meter: Optional[MemoryMeter] = None) -> Image.Image:
+    """
+    Відкриває фото з обмеженням пам'яті (Image.open читає лише заголовок):
+    1) JPEG через draft() декодується одразу в 1/2..1/8 — img.size стає розміром, який реально декодуємо;
+    2) цей розмір (для PNG/WebP/BMP — розмір із заголовка) понад MAX_PIXELS -> ImageTooLarge;
+    3) після декодування зменшуємо thumbnail() до max_side.
+    """
+    # вбудована перевірка PIL дивиться на розмір із заголовка і відкинула б 50–100 MP JPEG,
+    # які draft() декодує в 1/2..1/8 — вимикаємо її лише тут, бюджет перевіряємо нижче самі
+    saved = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        img = Image.open(path)
+    finally:
+        Image.MAX_IMAGE_PIXELS = saved
+
+    img.draft("RGB", (max_side, max_side))
+    w, h = img.size
+    if w * h > MAX_PIXELS:
+        img.close()
+        raise ImageTooLarge(f"Image too large: {w}x{h} px to decode (limit {MAX_PIXELS})")
+
+    img.load()
+    if img.mode != "RGB":
+        rgb = img.convert("RGB")
+        if meter is not None:
+            meter.track(img, rgb)
+        img.close()
+        img = rgb
+    elif meter is not None:
+        meter.track(img)
+    img.thumbnail((max_side, max_side))
+    return img
@@ -4,11 +4,19 @@ import os
 os.environ["TRANSFORMERS_NO_TF"] = "1"
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 
+# профіль потоків з autotune_threads.py — до імпорту torch і лише для запуску як скрипта:
+# train_distill / eval_thresholds імпортують цей модуль і не мають отримати потоки інференсу
+from thread_profile import apply_env, configure_torch
+
+THREAD_PROFILE = apply_env("predict") if __name__ == "__main__" else None
+
 import json
 import sys
 from typing import Any, Dict, List
 from PIL import Image
 
+from image_guard import ImageTooLarge, MemoryMeter, open_bounded
+
 DISEASE_MODEL = os.getenv("DISEASE_MODEL", "mesabo/agri-plant-disease-resnet50")
 CLIP_MODEL = os.getenv("CLIP_MODEL", "openai/clip-vit-base-patch32")
 
@@ -41,9 +49,20 @@ def emit(obj: Dict[str, Any], exit_code: int = 0) -> None:
     sys.exit(exit_code)
 
 
-def safe_open_image(image_path: str) -> Image.Image:
+def safe_open_image(image_path: str, meter: MemoryMeter) -> Image.Image:
     try:
-        return Image.open(image_path).convert("RGB")
+        return open_bounded(image_path, meter=meter)
+    except ImageTooLarge as e:
+        emit(
+            {
+                "ok": False,
+                "reason": "too_large",
+                "message": "Зображення завелике. Зменш роздільність фото і спробуй ще раз.",
+                "details": str(e),
+                "meta": {"memory": meter.report()},
+            },
+            0,
+        )
     except Exception:
         emit(
             {
@@ -62,6 +81,7 @@ def clip_gate(image: Image.Image) -> Dict[str, Any]:
     except Exception as e:
         return {"ok": False, "reason": "clip_missing", "message": f"CLIP import error: {e}"}
 
+    configure_torch(THREAD_PROFILE)
     device = "cuda" if torch.cuda.is_available() else "cpu"
 
     processor = CLIPProcessor.from_pretrained(CLIP_MODEL)
@@ -129,7 +149,8 @@ def main() -> None:
     if not os.path.exists(image_path):
         emit({"ok": False, "reason": "no_file", "message": "Image file not found", "path": image_path}, 0)
 
-    image = safe_open_image(image_path)
+    with MemoryMeter() as mem:
+        image = safe_open_image(image_path, meter=mem)
 
     gate = clip_gate(image)
     if not gate.get("ok"):
@@ -145,6 +166,7 @@ def main() -> None:
                 "plant_score": plant_score,
                 "best_clip_label": gate.get("best_clip_label"),
                 "best_clip_score": gate.get("best_clip_score"),
+                "meta": {"memory": mem.report()},
             },
             0,
         )
@@ -166,6 +188,8 @@ def main() -> None:
                 "disease_model": dis.get("model"),
                 "clip_model": CLIP_MODEL,
                 "plant_min_score": PLANT_MIN_SCORE,
+                # rss_peak_mb тут — пік усього процесу, тобто цього запиту разом з моделями
+                "memory": mem.report(),
             },
         },
         0,
@@ -5,19 +5,27 @@ from pathlib import Path
 
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 
+# профіль потоків з autotune_threads.py — до імпорту tensorflow і лише для запуску як скрипта:
+# train_distill / eval_thresholds імпортують цей модуль і не мають отримати потоки інференсу
+from thread_profile import apply_env, configure_tf
+
+THREAD_PROFILE = apply_env("predict_plantnet") if __name__ == "__main__" else None
+
 import numpy as np
 import tensorflow as tf
 from PIL import Image
 
+from image_guard import ImageTooLarge, MemoryMeter, open_bounded
+
 BASE_DIR = Path(__file__).resolve().parent
 MODEL_PATH = BASE_DIR / "plantnet_model.keras"
 LABELS_PATH = BASE_DIR / "plantnet_labels.json"
 
 IMG_SIZE = 224
-TOP_K = 3
+TOP_K = int(os.getenv("TOP_K", "3"))
 
-# якщо top1 нижче — кажемо що "не впевнено"
-UNSURE_THRESHOLD = 0.25
+# якщо top1 нижче — кажемо що "не впевнено" (рекомендацію дає eval_thresholds.py sweep)
+UNSURE_THRESHOLD = float(os.getenv("UNSURE_THRESHOLD", "0.25"))
 
 
 def center_crop_square(img: Image.Image) -> Image.Image:
@@ -28,8 +36,8 @@ def center_crop_square(img: Image.Image) -> Image.Image:
     return img.crop((left, top, left + side, top + side))
 
 
-def preprocess(img_path: str) -> np.ndarray:
-    img = Image.open(img_path).convert("RGB")
+def preprocess(img_path: str, meter: MemoryMeter = None) -> np.ndarray:
+    img = open_bounded(img_path, meter=meter)
     img = center_crop_square(img)
     img = img.resize((IMG_SIZE, IMG_SIZE))
     x = np.array(img).astype(np.float32) / 255.0
@@ -58,10 +66,17 @@ def main():
         print(json.dumps({"error": f"Labels not found: {str(LABELS_PATH)}"}, ensure_ascii=False))
         return
 
+    configure_tf(THREAD_PROFILE)
     model = tf.keras.models.load_model(MODEL_PATH)
     labels = load_labels()
 
-    x = preprocess(img_path)
+    try:
+        with MemoryMeter() as mem:
+            x = preprocess(img_path, meter=mem)
+    except ImageTooLarge as e:
+        print(json.dumps({"error": str(e), "reason": "too_large", "meta": {"memory": mem.report()}}, ensure_ascii=False))
+        return
+
     preds = model.predict(x, verbose=0)[0]
 
     top_idx = np.argsort(preds)[::-1][:TOP_K]
@@ -80,7 +95,8 @@ def main():
         "unsure": bool(unsure),
         "plantName": best["key"],
         "confidence": float(best["confidence"]),
-        "top": top
+        "top": top,
+        "meta": {"memory": mem.report()},
     }, ensure_ascii=False))
 
 
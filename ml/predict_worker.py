@@ -5,19 +5,42 @@ from pathlib import Path
 
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 
+# профіль потоків з autotune_threads.py — до імпорту tensorflow і лише для запуску як скрипта:
+# train_distill / eval_thresholds імпортують цей модуль і не мають отримати потоки інференсу
+from thread_profile import apply_env, configure_tf
+
+THREAD_PROFILE = apply_env("predict_worker") if __name__ == "__main__" else None
+
 import numpy as np
 import tensorflow as tf
 from PIL import Image
 
+from image_guard import STRIP_ROWS, ImageTooLarge, MemoryMeter, open_bounded
+
 BASE_DIR = Path(__file__).resolve().parent
-MODEL_PATH = BASE_DIR / "model.h5"
-LABELS_PATH = BASE_DIR / "labels.json"
+
+# USE_STUDENT=1 -> дистильований учень з train_distill.py (контракт як у predict.py)
+USE_STUDENT = os.getenv("USE_STUDENT", "0") == "1"
+
+if USE_STUDENT:
+    MODEL_PATH = BASE_DIR / "student_model.keras"
+    LABELS_PATH = BASE_DIR / "student_labels.json"
+else:
+    MODEL_PATH = BASE_DIR / "model.h5"
+    LABELS_PATH = BASE_DIR / "labels.json"
+STUDENT_META_PATH = BASE_DIR / "student_meta.json"
 
 IMG_SIZE = 224
-TOP_K = 3
+if USE_STUDENT and STUDENT_META_PATH.exists():
+    # учня могли навчити з іншим --img_size (train_distill.py пише його поруч з моделлю)
+    with open(STUDENT_META_PATH, "r", encoding="utf-8") as f:
+        IMG_SIZE = int(json.load(f).get("img_size", IMG_SIZE))
+TOP_K = int(os.getenv("TOP_K", "3"))
 
-PLANT_MIN_RATIO = 0.006
-UNSURE_THRESHOLD = 0.60
+# рекомендовані значення дає eval_thresholds.py sweep
+PLANT_MIN_RATIO = float(os.getenv("PLANT_MIN_RATIO", "0.006"))
+UNSURE_THRESHOLD = float(os.getenv("UNSURE_THRESHOLD", "0.60"))
+PLANT_MIN_SCORE = float(os.getenv("PLANT_MIN_SCORE", "0.55"))
 
 
 def center_crop_square(img: Image.Image) -> Image.Image:
@@ -28,33 +51,50 @@ def center_crop_square(img: Image.Image) -> Image.Image:
     return img.crop((left, top, left + side, top + side))
 
 
-def plant_bbox_crop(img: Image.Image):
-    arr = np.array(img.convert("RGB"))
-    r = arr[..., 0].astype(np.int16)
-    g = arr[..., 1].astype(np.int16)
-    b = arr[..., 2].astype(np.int16)
+def green_mask(rgb: np.ndarray, hsv: np.ndarray) -> np.ndarray:
+    r = rgb[..., 0].astype(np.int16)
+    g = rgb[..., 1].astype(np.int16)
+    b = rgb[..., 2].astype(np.int16)
 
     exg = 2 * g - r - b
     exg_mask = (exg > 15) & (g > 35)
 
-    hsv = np.array(img.convert("HSV"))
     h = hsv[..., 0].astype(np.int16)
     s = hsv[..., 1].astype(np.int16)
     v = hsv[..., 2].astype(np.int16)
 
     hsv_green = (h >= 20) & (h <= 85) & (s >= 25) & (v >= 25)
 
-    mask = exg_mask | hsv_green
-    plant_ratio = float(mask.mean())
+    return exg_mask | hsv_green
+
+
+def plant_bbox_crop(img: Image.Image):
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    W, H = img.size
+
+    # маска смугами по STRIP_ROWS рядків: тримаємо лише проекції на осі, а не повну маску
+    rows = np.zeros(H, dtype=bool)
+    cols = np.zeros(W, dtype=bool)
+    total = 0
+    for top in range(0, H, STRIP_ROWS):
+        bottom = min(H, top + STRIP_ROWS)
+        strip = img.crop((0, top, W, bottom))
+        mask = green_mask(np.asarray(strip), np.asarray(strip.convert("HSV")))
+        total += int(mask.sum())
+        rows[top:bottom] = mask.any(axis=1)
+        cols |= mask.any(axis=0)
+
+    plant_ratio = float(total / max(1, W * H))
 
     if plant_ratio < PLANT_MIN_RATIO:
         return center_crop_square(img), plant_ratio
 
-    ys, xs = np.where(mask)
-    y1, y2 = ys.min(), ys.max()
-    x1, x2 = xs.min(), xs.max()
+    ys = np.flatnonzero(rows)
+    xs = np.flatnonzero(cols)
+    y1, y2 = ys[0], ys[-1]
+    x1, x2 = xs[0], xs[-1]
 
-    H, W = arr.shape[0], arr.shape[1]
     pad_y = int((y2 - y1) * 0.12)
     pad_x = int((x2 - x1) * 0.12)
 
@@ -74,8 +114,8 @@ def load_labels():
     return {int(k): v for k, v in raw.items()}
 
 
-def preprocess(img_path: str):
-    img = Image.open(img_path).convert("RGB")
+def preprocess(img_path: str, meter: MemoryMeter = None):
+    img = open_bounded(img_path, meter=meter)
     cropped, plant_ratio = plant_bbox_crop(img)
     cropped = cropped.resize((IMG_SIZE, IMG_SIZE))
     x = np.array(cropped).astype(np.float32) / 255.0
@@ -83,14 +123,31 @@ def preprocess(img_path: str):
     return x, plant_ratio
 
 
+def preprocess_metered(img_path: str):
+    """
+    preprocess + пам'ять запиту. Для завеликого фото x = None, а error — готова відповідь too_large.
+    rss_peak_mb не віддаємо: у довгоживучому воркері це пік процесу за весь час.
+    """
+    with MemoryMeter() as mem:
+        try:
+            x, plant_ratio = preprocess(img_path, meter=mem)
+        except ImageTooLarge as e:
+            memory = mem.report(include_rss=False)
+            return None, None, memory, {"error": str(e), "reason": "too_large", "meta": {"memory": memory}}
+    return x, plant_ratio, mem.report(include_rss=False), None
+
+
 def predict_one(model, labels, img_path: str):
-    x, plant_ratio = preprocess(img_path)
+    x, plant_ratio, memory, error = preprocess_metered(img_path)
+    if error is not None:
+        return error
 
     if plant_ratio < PLANT_MIN_RATIO:
         return {
             "plant_detected": False,
             "reason": "Plant/leaf not detected (low plant area in frame)",
             "plant_ratio": plant_ratio,
+            "meta": {"memory": memory},
         }
 
     preds = model.predict(x, verbose=0)[0]
@@ -113,6 +170,45 @@ def predict_one(model, labels, img_path: str):
         "predictedKey": best["key"],
         "confidence": float(best["confidence"]),
         "top": top,
+        "meta": {"memory": memory},
+    }
+
+
+def predict_student(model, labels, img_path: str):
+    x, plant_ratio, memory, error = preprocess_metered(img_path)
+    if error is not None:
+        return error
+
+    probs, plant = model.predict(x, verbose=0)
+    probs = probs[0]
+    plant_score = float(plant[0][0])
+
+    if plant_score < PLANT_MIN_SCORE:
+        return {
+            "ok": False,
+            "reason": "not_plant",
+            "message": "Схоже, на фото не рослина/листок. Спробуй сфотографувати ближче листок при нормальному освітленні.",
+            "plant_score": plant_score,
+            "plant_ratio": plant_ratio,
+            "meta": {"memory": memory},
+        }
+
+    top_idx = np.argsort(probs)[::-1][:TOP_K]
+    top = [{"label": labels.get(int(i), f"class_{int(i)}"), "score": float(probs[i])} for i in top_idx]
+    best = top[0]
+
+    return {
+        "ok": True,
+        "predicted_key": best["label"],
+        "confidence": best["score"],
+        "top": top,
+        "plant_score": plant_score,
+        "plant_ratio": plant_ratio,
+        "meta": {
+            "disease_model": MODEL_PATH.name,
+            "plant_min_score": PLANT_MIN_SCORE,
+            "memory": memory,
+        },
     }
 
 
@@ -127,10 +223,14 @@ def main():
         sys.stdout.flush()
         return
 
+    configure_tf(THREAD_PROFILE)
+
     # Load once
     model = tf.keras.models.load_model(MODEL_PATH)
     labels = load_labels()
 
+    predict_fn = predict_student if USE_STUDENT else predict_one
+
     # Ready ping (optional)
     sys.stdout.write(json.dumps({"ready": True}, ensure_ascii=False) + "\n")
     sys.stdout.flush()
@@ -143,7 +243,7 @@ def main():
             break
 
         try:
-            result = predict_one(model, labels, img_path)
+            result = predict_fn(model, labels, img_path)
         except Exception as e:
             result = {"error": str(e)}
 
@@ -0,0 +1,76 @@
+import os
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+BASE_DIR = Path(__file__).resolve().parent
+PROFILE_PATH = Path(os.getenv("THREAD_PROFILE", str(BASE_DIR / "thread_profile.json")))
+
+# змінні, які читають OpenMP / MKL / TF під час імпорту бібліотек
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def load_profile(target: str) -> Optional[Dict[str, Any]]:
+    """
+    Повертає профіль потоків для скрипта `target` (predict / predict_worker / predict_plantnet)
+    з thread_profile.json, який пише autotune_threads.py. Якщо файлу нема — None.
+    """
+    if not PROFILE_PATH.exists():
+        return None
+    try:
+        with open(PROFILE_PATH, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except Exception:
+        return None
+    prof = (raw.get("profiles") or {}).get(target)
+    if not prof or int(prof.get("intra_op", 0)) <= 0:
+        return None
+    return prof
+
+
+def apply_env(target: str) -> Optional[Dict[str, Any]]:
+    """
+    Викликати ДО `import torch` / `import tensorflow`: OMP/MKL читають env лише при старті.
+    Явно задані користувачем змінні не перезаписуємо.
+    """
+    prof = load_profile(target)
+    if prof is None:
+        return None
+
+    intra = str(int(prof["intra_op"]))
+    inter = str(int(prof.get("inter_op", 1)))
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, intra)
+    os.environ.setdefault("TF_NUM_INTRAOP_THREADS", intra)
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", inter)
+    return prof
+
+
+def configure_torch(prof: Optional[Dict[str, Any]]) -> None:
+    if prof is None:
+        return
+    import torch
+
+    torch.set_num_threads(int(os.environ.get("OMP_NUM_THREADS", prof["intra_op"])))
+    try:
+        # можна викликати лише один раз і до першої паралельної операції
+        torch.set_num_interop_threads(int(os.environ.get("TF_NUM_INTEROP_THREADS", prof.get("inter_op", 1))))
+    except RuntimeError:
+        pass
+
+
+def configure_tf(prof: Optional[Dict[str, Any]]) -> None:
+    if prof is None:
+        return
+    import tensorflow as tf
+
+    try:
+        # працює лише до ініціалізації TF runtime (до load_model / першої операції)
+        tf.config.threading.set_intra_op_parallelism_threads(
+            int(os.environ.get("TF_NUM_INTRAOP_THREADS", prof["intra_op"]))
+        )
+        tf.config.threading.set_inter_op_parallelism_threads(
+            int(os.environ.get("TF_NUM_INTEROP_THREADS", prof.get("inter_op", 1)))
+        )
+    except RuntimeError:
+        pass
@@ -0,0 +1,361 @@
+import os
+
+# Transformers тільки на PyTorch (як у predict.py)
+os.environ["TRANSFORMERS_NO_TF"] = "1"
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+
+import sys
+import json
+import time
+import argparse
+import random
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+
+import predict  # noqa: E402  (CLIP_MODEL, DISEASE_MODEL, CANDIDATE_LABELS, PLANT_LABELS, PLANT_MIN_SCORE)
+from image_guard import open_bounded  # noqa: E402
+
+IMG_EXT = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def set_seed(seed: int):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def find_images(root: Path):
+    return sorted(str(p) for p in root.rglob("*") if p.is_file() and p.suffix.lower() in IMG_EXT)
+
+
+# ===== ВЧИТЕЛІ (CLIP + ResNet-50) =====
+
+def teacher_pass(paths, batch_size):
+    """
+    Один прохід вчителів по всіх зображеннях.
+    Повертає логіти хвороб (N×C), plant_score (N), назви класів і середній час на фото.
+    Фото відкриваються через open_bounded, як у predict.py, — м'які мітки з тих самих пікселів.
+    """
+    import torch
+    from transformers import AutoImageProcessor, AutoModelForImageClassification, CLIPModel, CLIPProcessor
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    clip_proc = CLIPProcessor.from_pretrained(predict.CLIP_MODEL)
+    clip = CLIPModel.from_pretrained(predict.CLIP_MODEL).to(device).eval()
+    dis_proc = AutoImageProcessor.from_pretrained(predict.DISEASE_MODEL)
+    dis = AutoModelForImageClassification.from_pretrained(predict.DISEASE_MODEL).to(device).eval()
+
+    id2label = dis.config.id2label
+    class_names = [id2label[i] for i in range(len(id2label))]
+    n_plant = len(predict.PLANT_LABELS)  # PLANT_LABELS стоять першими в CANDIDATE_LABELS
+
+    logits, plant = [], []
+    t_total = 0.0
+    for s in range(0, len(paths), batch_size):
+        images = [open_bounded(p) for p in paths[s:s + batch_size]]
+        t0 = time.perf_counter()
+        with torch.no_grad():
+            ci = clip_proc(text=predict.CANDIDATE_LABELS, images=images, return_tensors="pt", padding=True)
+            ci = {k: v.to(device) for k, v in ci.items()}
+            probs = clip(**ci).logits_per_image.softmax(dim=1)
+            plant.append(probs[:, :n_plant].sum(dim=1).cpu().numpy())
+
+            di = dis_proc(images=images, return_tensors="pt")
+            di = {k: v.to(device) for k, v in di.items()}
+            logits.append(dis(**di).logits.cpu().numpy())
+        t_total += time.perf_counter() - t0
+        print(f"  вчителі: {min(s + batch_size, len(paths))}/{len(paths)}", end="\r")
+    print()
+
+    return (
+        np.concatenate(logits).astype(np.float32),
+        np.concatenate(plant).astype(np.float32),
+        class_names,
+        1000.0 * t_total / max(1, len(paths)),
+    )
+
+
+def load_or_build_cache(cache_path: Path, paths, batch_size):
+    if cache_path.exists():
+        c = np.load(cache_path, allow_pickle=False)
+        # старі кеші без назв моделей вважаємо застарілими
+        same_models = (
+            "clip_model" in c.files and "disease_model" in c.files
+            and str(c["clip_model"]) == predict.CLIP_MODEL
+            and str(c["disease_model"]) == predict.DISEASE_MODEL
+        )
+        if same_models and list(c["paths"]) == list(paths):
+            print("✅ Кеш вчителів:", cache_path)
+            return c["logits"], c["plant_score"], list(c["class_names"]), float(c["teacher_ms"])
+        print("⚠️ Кеш не збігається з набором фото або моделями вчителів — перераховую")
+
+    print("🧑‍🏫 Прогін вчителів (один раз)...")
+    logits, plant, names, teacher_ms = teacher_pass(paths, batch_size)
+    np.savez_compressed(
+        cache_path,
+        paths=np.array(paths),
+        logits=logits,
+        plant_score=plant,
+        class_names=np.array(names),
+        teacher_ms=np.float32(teacher_ms),
+        clip_model=np.array(predict.CLIP_MODEL),
+        disease_model=np.array(predict.DISEASE_MODEL),
+    )
+    print("✅ Кеш збережено:", cache_path)
+    return logits, plant, names, teacher_ms
+
+
+# ===== УЧЕНЬ =====
+
+def make_student_dataset(paths, idx, t_logits, t_plant, img_size, batch_size, shuffle, seed):
+    """
+    Потоковий tf.data по шляхах (як flow_from_directory у train.py) + кешовані виходи вчителів.
+    Препроцес той самий, що й при обслуговуванні в predict_worker.py.
+    """
+    import tensorflow as tf
+    import predict_worker
+
+    predict_worker.IMG_SIZE = img_size
+    rng = np.random.RandomState(seed)
+    num_classes = t_logits.shape[1]
+
+    def gen():
+        order = np.array(idx)
+        if shuffle:
+            rng.shuffle(order)  # генератор викликається заново кожну епоху — новий порядок
+        for i in order:
+            x, _ = predict_worker.preprocess(paths[i])
+            yield x[0], {"disease_logits": t_logits[i], "plant": t_plant[i:i + 1]}
+
+    output_signature = (
+        tf.TensorSpec(shape=(img_size, img_size, 3), dtype=tf.float32),
+        {
+            "disease_logits": tf.TensorSpec(shape=(num_classes,), dtype=tf.float32),
+            "plant": tf.TensorSpec(shape=(1,), dtype=tf.float32),
+        },
+    )
+    ds = tf.data.Dataset.from_generator(gen, output_signature=output_signature)
+    return ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+def softmax(z, t=1.0):
+    z = z / t
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def build_student(arch, num_classes, img_size, lr, temperature, plant_weight):
+    import tensorflow as tf
+
+    if arch == "efficientnet":
+        base = tf.keras.applications.EfficientNetV2B0(
+            include_top=False, weights="imagenet", input_shape=(img_size, img_size, 3),
+            include_preprocessing=False,
+        )
+    else:
+        base = tf.keras.applications.MobileNetV2(
+            include_top=False, weights="imagenet", input_shape=(img_size, img_size, 3),
+        )
+    base.trainable = False
+
+    inputs = tf.keras.Input(shape=(img_size, img_size, 3))
+    # вхід 0..1 (як у predict_worker), базові мережі чекають -1..1
+    x = tf.keras.layers.Rescaling(2.0, offset=-1.0)(inputs)
+    x = base(x, training=False)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    x = tf.keras.layers.Dropout(0.2)(x)
+    disease_logits = tf.keras.layers.Dense(num_classes, name="disease_logits")(x)
+    plant = tf.keras.layers.Dense(1, activation="sigmoid", name="plant")(x)
+
+    train_model = tf.keras.Model(inputs, {"disease_logits": disease_logits, "plant": plant})
+
+    def kd_loss(y_teacher_logits, y_student_logits):
+        p_t = tf.nn.softmax(y_teacher_logits / temperature)
+        log_p_s = tf.nn.log_softmax(y_student_logits / temperature)
+        return -tf.reduce_mean(tf.reduce_sum(p_t * log_p_s, axis=-1)) * (temperature ** 2)
+
+    train_model.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=lr),
+        loss={"disease_logits": kd_loss, "plant": "binary_crossentropy"},
+        loss_weights={"disease_logits": 1.0, "plant": plant_weight},
+    )
+
+    # модель для обслуговування: ймовірності хвороб + plant_score, без кастомного лоса
+    probs = tf.keras.layers.Softmax(name="disease")(disease_logits)
+    serve_model = tf.keras.Model(inputs, [probs, plant])
+    return train_model, serve_model, base
+
+
+# ===== ЛАТЕНТНІСТЬ: обидві моделі на CPU, батч 1, з декодуванням і препроцесом =====
+
+def time_teacher(paths, reps=3):
+    import torch
+    from transformers import AutoImageProcessor, AutoModelForImageClassification, CLIPModel, CLIPProcessor
+
+    clip_proc = CLIPProcessor.from_pretrained(predict.CLIP_MODEL)
+    clip = CLIPModel.from_pretrained(predict.CLIP_MODEL).to("cpu").eval()
+    dis_proc = AutoImageProcessor.from_pretrained(predict.DISEASE_MODEL)
+    dis = AutoModelForImageClassification.from_pretrained(predict.DISEASE_MODEL).to("cpu").eval()
+
+    def run(p):
+        image = open_bounded(p)
+        with torch.no_grad():
+            ci = clip_proc(text=predict.CANDIDATE_LABELS, images=image, return_tensors="pt", padding=True)
+            clip(**ci).logits_per_image.softmax(dim=1)
+            dis(**dis_proc(images=image, return_tensors="pt")).logits.softmax(dim=1)
+
+    run(paths[0])  # прогрів
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        for p in paths:
+            run(p)
+    return 1000.0 * (time.perf_counter() - t0) / (reps * max(1, len(paths)))
+
+
+def time_student(model, paths, img_size, reps=3):
+    import tensorflow as tf
+    import predict_worker
+
+    predict_worker.IMG_SIZE = img_size
+
+    def run(p):
+        # так само, як predict_worker.predict_student
+        with tf.device("/CPU:0"):
+            x, _ = predict_worker.preprocess(p)
+            model.predict(x, verbose=0)
+
+    run(paths[0])  # прогрів
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        for p in paths:
+            run(p)
+    return 1000.0 * (time.perf_counter() - t0) / (reps * max(1, len(paths)))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Дистиляція CLIP + ResNet-50 у легкого CPU-учня")
+    ap.add_argument("--data_dir", type=str, default="data/train")
+    ap.add_argument("--cache", type=str, default="distill_cache.npz")
+    ap.add_argument("--out_model", type=str, default=str(BASE_DIR / "student_model.keras"))
+    ap.add_argument("--out_labels", type=str, default=str(BASE_DIR / "student_labels.json"))
+    ap.add_argument("--out_meta", type=str, default=str(BASE_DIR / "student_meta.json"))
+    ap.add_argument("--out_report", type=str, default=str(BASE_DIR / "student_report.json"))
+    ap.add_argument("--arch", choices=["mobilenetv2", "efficientnet"], default="mobilenetv2")
+    ap.add_argument("--img_size", type=int, default=224)
+    ap.add_argument("--batch", type=int, default=32)
+    ap.add_argument("--teacher_batch", type=int, default=16)
+    ap.add_argument("--epochs", type=int, default=8)
+    ap.add_argument("--finetune_epochs", type=int, default=3)
+    ap.add_argument("--lr", type=float, default=1e-3)
+    ap.add_argument("--temperature", type=float, default=4.0)
+    ap.add_argument("--plant_weight", type=float, default=0.5)
+    ap.add_argument("--val_split", type=float, default=0.15)
+    ap.add_argument("--max_samples", type=int, default=0, help="0 = усі фото")
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    set_seed(args.seed)
+
+    root = Path(args.data_dir).resolve()
+    if not root.exists():
+        raise SystemExit(f"❌ Нема папки: {root}")
+
+    paths = find_images(root)
+    if args.max_samples and args.max_samples > 0:
+        random.Random(args.seed).shuffle(paths)
+        paths = sorted(paths[:args.max_samples])
+    if len(paths) < 2:
+        raise SystemExit(f"❌ Замало зображень у {root}")
+    print("✅ Зображень:", len(paths))
+
+    t_logits, t_plant, class_names, _ = load_or_build_cache(Path(args.cache), paths, args.teacher_batch)
+    num_classes = len(class_names)
+    print("✅ Класів у вчителя:", num_classes)
+
+    import tensorflow as tf
+
+    tf.random.set_seed(args.seed)
+
+    idx = np.random.RandomState(args.seed).permutation(len(paths))
+    n_val = max(1, int(len(paths) * args.val_split))
+    val_idx, train_idx = idx[:n_val], idx[n_val:]
+
+    train_ds = make_student_dataset(
+        paths, train_idx, t_logits, t_plant, args.img_size, args.batch, shuffle=True, seed=args.seed
+    )
+    val_ds = make_student_dataset(
+        paths, val_idx, t_logits, t_plant, args.img_size, args.batch, shuffle=False, seed=args.seed
+    )
+
+    train_model, serve_model, base = build_student(
+        args.arch, num_classes, args.img_size, args.lr, args.temperature, args.plant_weight
+    )
+
+    print("🚀 Дистиляція (голова)...")
+    train_model.fit(train_ds, validation_data=val_ds, epochs=args.epochs, verbose=1)
+
+    if args.finetune_epochs > 0:
+        print("🛠️ Finetune: розморожую останні шари...")
+        base.trainable = True
+        for layer in base.layers[:-30]:
+            layer.trainable = False
+        train_model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=args.lr * 0.1),
+            loss=train_model.loss,
+            loss_weights={"disease_logits": 1.0, "plant": args.plant_weight},
+        )
+        train_model.fit(train_ds, validation_data=val_ds, epochs=args.finetune_epochs, verbose=1)
+
+    # ===== ЗВІТ =====
+    s_probs, s_plant = serve_model.predict(val_ds, verbose=0)
+    s_plant = s_plant[:, 0]
+    t_probs = softmax(t_logits[val_idx])
+    tv_plant = t_plant[val_idx]
+
+    top1 = float(np.mean(s_probs.argmax(1) == t_probs.argmax(1)))
+    top3 = float(np.mean([t in set(np.argsort(s)[::-1][:3]) for s, t in zip(s_probs, t_probs.argmax(1))]))
+    gate = float(np.mean((s_plant >= predict.PLANT_MIN_SCORE) == (tv_plant >= predict.PLANT_MIN_SCORE)))
+
+    timing_paths = [paths[i] for i in val_idx[:32]]
+    print("⏱️ Заміри латентності (CPU, батч 1)...")
+    teacher_ms = time_teacher(timing_paths)
+    student_ms = time_student(serve_model, timing_paths, args.img_size)
+
+    report = {
+        "arch": args.arch,
+        "img_size": args.img_size,
+        "samples": {"train": int(len(train_idx)), "val": int(len(val_idx))},
+        "agreement_top1": top1,
+        "agreement_top3": top3,
+        "plant_gate_agreement": gate,
+        "plant_score_mae": float(np.mean(np.abs(s_plant - tv_plant))),
+        # обидва: CPU, батч 1, разом з декодуванням фото і препроцесом
+        "teacher_ms_per_image": teacher_ms,
+        "student_ms_per_image": student_ms,
+        "speedup": teacher_ms / student_ms if student_ms > 0 else None,
+        "teachers": {"clip": predict.CLIP_MODEL, "disease": predict.DISEASE_MODEL},
+    }
+
+    serve_model.save(Path(args.out_model).resolve())
+    with open(args.out_labels, "w", encoding="utf-8") as f:
+        json.dump({i: name for i, name in enumerate(class_names)}, f, ensure_ascii=False, indent=2)
+    # predict_worker (USE_STUDENT=1) бере звідси розмір входу учня
+    with open(args.out_meta, "w", encoding="utf-8") as f:
+        json.dump({"img_size": args.img_size, "arch": args.arch}, f, ensure_ascii=False, indent=2)
+    with open(args.out_report, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"📊 Збіг top-1 з вчителем: {top1:.3f}, top-3: {top3:.3f}, гейт рослини: {gate:.3f}")
+    print(f"⏱️ Вчитель: {teacher_ms:.1f} мс/фото, учень: {student_ms:.1f} мс/фото")
+    print("✅ Збережено модель:", Path(args.out_model).resolve())
+    print("✅ Збережено labels:", Path(args.out_labels).resolve())
+    print("🎉 Готово!")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import argparse
 import random
 import math
 import io
+import time
 from pathlib import Path
 
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
@@ -102,23 +103,31 @@ def make_tf_dataset(hfds, image_col, label_col, img_size, batch_size, shuffle, m
     return ds, n
 
 
-def build_model(num_classes, img_size, lr):
+def build_backbone(num_classes):
+    # довільна роздільність входу: ті самі ваги працюють на всіх стадіях progressive-режиму
     base = tf.keras.applications.EfficientNetV2B0(
         include_top=False,
         weights="imagenet",
-        input_shape=(img_size, img_size, 3),
+        input_shape=(None, None, 3),
     )
     base.trainable = False  # стартуємо як transfer learning
 
-    inputs = tf.keras.Input(shape=(img_size, img_size, 3))
-    x = inputs
-    x = tf.keras.layers.RandomFlip("horizontal")(x)
-    x = tf.keras.layers.RandomRotation(0.06)(x)
-    x = tf.keras.layers.RandomZoom(0.10)(x)
-    x = base(x, training=False)
+    inputs = tf.keras.Input(shape=(None, None, 3))
+    x = base(inputs, training=False)
     x = tf.keras.layers.GlobalAveragePooling2D()(x)
     x = tf.keras.layers.Dropout(0.25)(x)
     outputs = tf.keras.layers.Dense(num_classes, activation="softmax")(x)
+    return tf.keras.Model(inputs, outputs), base
+
+
+def build_model(core, img_size, lr, aug_scale=1.0):
+    # аугментації створюються заново під кожну роздільність; на малих фото — слабші
+    inputs = tf.keras.Input(shape=(img_size, img_size, 3))
+    x = inputs
+    x = tf.keras.layers.RandomFlip("horizontal")(x)
+    x = tf.keras.layers.RandomRotation(0.06 * aug_scale)(x)
+    x = tf.keras.layers.RandomZoom(0.10 * aug_scale)(x)
+    outputs = core(x)
 
     model = tf.keras.Model(inputs, outputs)
     model.compile(
@@ -126,7 +135,135 @@ def build_model(num_classes, img_size, lr):
         loss="sparse_categorical_crossentropy",
         metrics=["accuracy"],
     )
-    return model, base
+    return model
+
+
+def stage_plan(sizes, epochs, img_size, batch):
+    """
+    [(img_size, batch, epochs), ...] для progressive resizing.
+    Батч росте обернено до площі кадру (кратно 8), епохи ділимо порівну, залишок — на повну роздільність.
+    """
+    sizes = sorted({s for s in sizes if s < img_size}) + [img_size]
+    sizes = sizes[-max(1, epochs):]
+    per = epochs // len(sizes)
+    plan = []
+    for i, s in enumerate(sizes):
+        b = max(batch, int(round(batch * (img_size / s) ** 2 / 8)) * 8)
+        e = per + (epochs - per * len(sizes) if i == len(sizes) - 1 else 0)
+        plan.append((s, b, max(1, e)))
+    return plan
+
+
+class EpochTimer(tf.keras.callbacks.Callback):
+    """Накопичує wall-clock і val_accuracy по всіх стадіях і finetune."""
+
+    def __init__(self):
+        super().__init__()
+        self.elapsed = 0.0
+        self.history = []
+        self.img_size = None
+        self._t0 = 0.0
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._t0 = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.elapsed += time.perf_counter() - self._t0
+        self.history.append({
+            "img_size": self.img_size,
+            "elapsed_s": self.elapsed,
+            "val_accuracy": float((logs or {}).get("val_accuracy", 0.0)),
+        })
+
+    def time_to(self, target):
+        for h in self.history:
+            if h["val_accuracy"] >= target:
+                return h["elapsed_s"]
+        return None
+
+    def best(self):
+        return max((h["val_accuracy"] for h in self.history), default=0.0)
+
+
+def train_schedule(args, plan, num_classes, train_hf, val_hf, image_col, label_col, ckpt_path=None):
+    set_seed(args.seed)
+    core, base = build_backbone(num_classes)
+    timer = EpochTimer()
+
+    model = None
+    steps_per_epoch = val_steps = 1
+    train_tf = val_tf = None
+    for i, (size, batch, epochs) in enumerate(plan):
+        last = i == len(plan) - 1
+
+        # датасети перебудовуємо під роздільність і батч стадії
+        train_tf, train_n = make_tf_dataset(
+            train_hf, image_col, label_col, size, batch,
+            shuffle=True, max_samples=args.max_train, seed=args.seed
+        )
+        val_tf, val_n = make_tf_dataset(
+            val_hf, image_col, label_col, size, batch,
+            shuffle=False, max_samples=args.max_val, seed=args.seed
+        )
+        if i == 0:
+            print(f"✅ Train прикладів: {train_n}, Val прикладів: {val_n}")
+
+        # лінійне масштабування lr під більший батч
+        model = build_model(core, size, args.lr * batch / args.batch, aug_scale=size / args.img_size)
+        steps_per_epoch = max(1, math.floor(train_n / batch))
+        val_steps = max(1, math.floor(val_n / batch))
+        timer.img_size = size
+
+        callbacks = [timer]
+        if last:
+            # чекпоінт і early stopping — лише на повній роздільності
+            if ckpt_path:
+                callbacks.append(tf.keras.callbacks.ModelCheckpoint(
+                    filepath=ckpt_path,
+                    monitor="val_accuracy",
+                    save_best_only=True,
+                    verbose=1,
+                ))
+            callbacks.append(tf.keras.callbacks.EarlyStopping(
+                monitor="val_accuracy",
+                patience=2,
+                restore_best_weights=True,
+                verbose=1,
+            ))
+
+        print(f"🚀 Стадія {i + 1}/{len(plan)}: {size}px, batch {batch}, епох {epochs}")
+        model.fit(
+            train_tf,
+            validation_data=val_tf,
+            epochs=epochs,
+            steps_per_epoch=steps_per_epoch,
+            validation_steps=val_steps,
+            callbacks=callbacks,
+            verbose=1,
+        )
+
+    # легкий finetune останніх шарів
+    print("🛠️ Finetune: розморожую частину EfficientNet...")
+    base.trainable = True
+    for layer in base.layers[:-40]:
+        layer.trainable = False
+
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=args.lr * 0.1),
+        loss="sparse_categorical_crossentropy",
+        metrics=["accuracy"],
+    )
+
+    model.fit(
+        train_tf,
+        validation_data=val_tf,
+        epochs=max(1, args.epochs // 2),
+        steps_per_epoch=steps_per_epoch,
+        validation_steps=val_steps,
+        callbacks=[timer],
+        verbose=1,
+    )
+    return model, timer
 
 
 def main():
@@ -141,6 +278,11 @@ def main():
     ap.add_argument("--max_train", type=int, default=0, help="0 = весь train; для тесту постав 20000")
     ap.add_argument("--max_val", type=int, default=0)
     ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--progressive", action="store_true", help="ранні епохи на меншій роздільності")
+    ap.add_argument("--stages", type=str, default="128,160,224", help="роздільності стадій; остання = --img_size")
+    ap.add_argument("--compare_fixed", action="store_true", help="додатково прогнати фіксовану роздільність")
+    ap.add_argument("--target_acc", type=float, default=0.0, help="0 = найкраща точність, досягнута всіма прогонами")
+    ap.add_argument("--out_report", type=str, default="plantnet_schedule_report.json")
     args = ap.parse_args()
 
     set_seed(args.seed)
@@ -194,67 +336,39 @@ def main():
     num_classes = len(label_names)
     print("✅ Класів:", num_classes)
 
-    # TF datasets
-    train_tf, train_n = make_tf_dataset(
-        train_hf, image_col, label_col, args.img_size, args.batch,
-        shuffle=True, max_samples=args.max_train, seed=args.seed
-    )
-    val_tf, val_n = make_tf_dataset(
-        val_hf, image_col, label_col, args.img_size, args.batch,
-        shuffle=False, max_samples=args.max_val, seed=args.seed
-    )
-
-    print(f"✅ Train прикладів: {train_n}, Val прикладів: {val_n}")
-
-    model, base = build_model(num_classes, args.img_size, args.lr)
-
-    steps_per_epoch = max(1, math.floor(train_n / args.batch))
-    val_steps = max(1, math.floor(val_n / args.batch))
-
-    ckpt = tf.keras.callbacks.ModelCheckpoint(
-        filepath="plantnet_best.keras",
-        monitor="val_accuracy",
-        save_best_only=True,
-        verbose=1,
-    )
-    early = tf.keras.callbacks.EarlyStopping(
-        monitor="val_accuracy",
-        patience=2,
-        restore_best_weights=True,
-        verbose=1,
-    )
-
-    print("🚀 Старт тренування (transfer learning)...")
-    model.fit(
-        train_tf,
-        validation_data=val_tf,
-        epochs=args.epochs,
-        steps_per_epoch=steps_per_epoch,
-        validation_steps=val_steps,
-        callbacks=[ckpt, early],
-        verbose=1,
-    )
-
-    # легкий finetune останніх шарів
-    print("🛠️ Finetune: розморожую частину EfficientNet...")
-    base.trainable = True
-    for layer in base.layers[:-40]:
-        layer.trainable = False
+    fixed_plan = [(args.img_size, args.batch, args.epochs)]
+    if args.progressive:
+        sizes = [int(x) for x in args.stages.split(",") if x.strip()]
+        plan = stage_plan(sizes, args.epochs, args.img_size, args.batch)
+    else:
+        plan = fixed_plan
+    print("✅ План:", plan)
 
-    model.compile(
-        optimizer=tf.keras.optimizers.Adam(learning_rate=args.lr * 0.1),
-        loss="sparse_categorical_crossentropy",
-        metrics=["accuracy"],
+    model, timer = train_schedule(
+        args, plan, num_classes, train_hf, val_hf, image_col, label_col, ckpt_path="plantnet_best.keras"
     )
 
-    model.fit(
-        train_tf,
-        validation_data=val_tf,
-        epochs=max(1, args.epochs // 2),
-        steps_per_epoch=steps_per_epoch,
-        validation_steps=val_steps,
-        verbose=1,
-    )
+    runs = {"progressive" if args.progressive else "fixed": timer}
+    if args.progressive and args.compare_fixed:
+        print("⚖️ Порівняння: фіксована роздільність...")
+        _, runs["fixed"] = train_schedule(args, fixed_plan, num_classes, train_hf, val_hf, image_col, label_col)
+
+    # якщо ціль не задана — найкраща точність, яку досягли всі прогони
+    target = args.target_acc if args.target_acc > 0 else min(t.best() for t in runs.values())
+    report = {"target_acc": target, "plan": plan, "runs": {}}
+    for name, t in runs.items():
+        report["runs"][name] = {
+            "time_to_target_s": t.time_to(target),
+            "best_val_accuracy": t.best(),
+            "total_s": t.elapsed,
+            "epochs": t.history,
+        }
+        tt = t.time_to(target)
+        print(f"⏱️ {name}: до val_accuracy≥{target:.3f} — {f'{tt:.0f} с' if tt is not None else 'не досягнуто'}, "
+              f"усього {t.elapsed:.0f} с")
+
+    with open(args.out_report, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
 
     out_model = Path(args.out_model).resolve()
     out_labels = Path(args.out_labels).resolve()